@@ -0,0 +1,138 @@
+"""
+Throughput of sync vs gevent gunicorn workers against a slow upstream.
+
+Starts a stub Telegram API that takes --upstream-delay seconds per call,
+then for each worker class boots gunicorn through serve.py and fires
+/start webhooks at it. Each webhook makes one outbound sendMessage call and
+touches no database, so the only thing being measured is how many waiting
+requests a worker can hold.
+
+    python -m benchmarks.async_throughput --requests 400 --concurrency 100
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import start_stub
+
+WORKER_CLASSES = ("sync", "gevent")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(worker_class, port, telegram_url, workers):
+    env = dict(
+        os.environ,
+        ENABLED_FEATURES="vivi",
+        TELEGRAM_BOT_TOKEN="123456:benchmark",
+        TELEGRAM_API_URL=telegram_url,
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_WORKERS=str(workers),
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "serve.py",
+            "-b",
+            f"127.0.0.1:{port}",
+            "--log-level=warning",
+            f"--access-logfile={os.devnull}",
+            "main:app",
+        ],
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not start")
+
+
+def start_update(n):
+    return json.dumps(
+        {
+            "update_id": n,
+            "message": {
+                "message_id": n,
+                "date": int(time.time()),
+                "chat": {"id": 1000 + n, "type": "private"},
+                "from": {"id": 1000 + n, "is_bot": False, "first_name": "Bench"},
+                "text": "/start",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        }
+    ).encode("utf-8")
+
+
+def send_webhook(port, n):
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}/vivi/telegram",
+        data=start_update(n),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+
+def run(worker_class, args, telegram_url):
+    port = free_port()
+    process = start_server(worker_class, port, telegram_url, args.workers)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            latencies = sorted(pool.map(lambda n: send_webhook(port, n), range(args.requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{worker_class:<7} {args.requests / elapsed:7.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.0f}ms  p99 {p99 * 1000:7.0f}ms"
+    )
+    return args.requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--upstream-delay", type=float, default=0.5, help="seconds per stub Telegram call")
+    args = parser.parse_args()
+
+    server, telegram_url = start_stub(delay=args.upstream_delay)
+    print(
+        f"{args.requests} webhooks, {args.concurrency} concurrent, {args.workers} workers, "
+        f"{args.upstream_delay * 1000:.0f}ms upstream"
+    )
+    try:
+        throughput = {worker_class: run(worker_class, args, telegram_url) for worker_class in WORKER_CLASSES}
+    finally:
+        server.shutdown()
+    print(f"gevent is {throughput['gevent'] / throughput['sync']:.1f}x sync")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Offline latency and throughput benchmark for every endpoint.
+
+Builds a throwaway database on the MySQL server named by the usual MYSQL*
+environment variables, applies benchmarks/schema.sql and every file in
+database/migrations, and seeds it with a fixed random seed. Telegram, OpenAI
+and Bunny are replaced with local stub servers, so nothing leaves the machine.
+Each scenario is driven through Flask's test client and reported as p50/p99
+latency and single-client throughput.
+
+Results are written as JSON; pass an earlier file to --compare to see the
+change per scenario.
+
+    python -m benchmarks.endpoints --output benchmarks/results/baseline.json
+    python -m benchmarks.endpoints --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from benchmarks.stubs import BunnyStub, OpenAIStub, TelegramStub, start_stub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRESENTERS = ["Dan", "Anna", "Andrew", "James"]
+BENCH_USERNAME = "bench"
+BENCH_SENDER = 900000  # Telegram id of the verified sender posting to the bench device
+
+
+def server_connection(database=None):
+    return mysql.connector.connect(
+        host=os.getenv("MYSQLHOST"),
+        user=os.getenv("MYSQLUSER"),
+        password=os.getenv("MYSQL_ROOT_PASSWORD"),
+        port=os.getenv("MYSQLPORT"),
+        database=database,
+    )
+
+
+def run_sql_file(cursor, path):
+    with open(path) as f:
+        lines = [line for line in f if not line.lstrip().startswith("--")]
+    for statement in "".join(lines).split(";"):
+        if statement.strip():
+            cursor.execute(statement)
+
+
+def create_database(name):
+    """Drop and recreate `name`, then build the current schema in it."""
+    connection = server_connection()
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+    cursor.execute(f"CREATE DATABASE `{name}`")
+    cursor.execute(f"USE `{name}`")
+    run_sql_file(cursor, os.path.join(ROOT, "benchmarks", "schema.sql"))
+    for migration in sorted(glob.glob(os.path.join(ROOT, "database", "migrations", "*.sql"))):
+        run_sql_file(cursor, migration)
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def seed(name, args, rng):
+    """Fill the benchmark database; returns the bench device's API token."""
+    from database.devices import register_device
+
+    connection = server_connection(name)
+    cursor = connection.cursor()
+    now = datetime.utcnow()
+
+    episodes = []
+    for number in range(1, args.episodes + 1):
+        presenters = ", ".join(rng.sample(PRESENTERS, rng.randint(2, 4)))
+        episodes.append(
+            (
+                number,
+                f"No Such Thing As Episode {number}",
+                presenters,
+                rng.choice(["London", "Sydney", "Edinburgh", "Studio"]),
+                (now - timedelta(days=7 * (args.episodes - number))).date(),
+                rng.choice(["live", "not_live", "not_live", "not_live"]),
+            )
+        )
+    cursor.executemany(
+        "INSERT INTO fish_episodes (number, title, presenters, location, date, is_live) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        episodes,
+    )
+
+    cursor.execute("INSERT INTO users (username) VALUES (%s)", (BENCH_USERNAME,))
+    user_id = cursor.lastrowid
+    history = [
+        (user_id, episode_id, now - timedelta(minutes=rng.randint(0, 60 * 24 * 730)))
+        for episode_id in rng.sample(range(1, args.episodes + 1), min(args.history, args.episodes))
+    ]
+    cursor.executemany(
+        "INSERT INTO fish_listening_history (user_id, episode_id, listened_at) VALUES (%s, %s, %s)", history
+    )
+    connection.commit()
+
+    # One bench device with a deep queue, plus other devices sharing the table
+    devices = [register_device(f"device-{i}") for i in range(args.devices)]
+    bench_device_id, bench_token = devices[0]
+    for i, (device_id, _) in enumerate(devices):
+        cursor.execute(
+            "INSERT INTO vivi_users (phone, verified, blocked, device_id) VALUES (%s, 1, 0, %s)",
+            (str(BENCH_SENDER + i), device_id),
+        )
+        cursor.execute("INSERT INTO vivi_nightlight (id, expires_at) VALUES (%s, %s)", (device_id, now))
+
+    messages = []
+    for n in range(args.messages):
+        index = 0 if n % 2 == 0 else rng.randrange(len(devices))
+        messages.append(
+            (
+                f"Hello Vivi, message {n}",
+                now - timedelta(seconds=args.messages - n),
+                "text",
+                "Bench Sender",
+                str(BENCH_SENDER + index),
+                f"http://cdn.example/audio_{n}.mp3",
+                devices[index][0],
+            )
+        )
+        if len(messages) == 5000:
+            insert_messages(cursor, messages)
+            messages = []
+    insert_messages(cursor, messages)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return bench_device_id, bench_token
+
+
+def insert_messages(cursor, rows):
+    if rows:
+        cursor.executemany(
+            "INSERT INTO vivi_messages (message, received_at, type, sender_name, sender_number, mp3_url, listened, "
+            "device_id, queued) VALUES (%s, %s, %s, %s, %s, %s, 0, %s, 1)",
+            rows,
+        )
+
+
+def queued_message_ids(name, device_id, limit):
+    connection = server_connection(name)
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT id FROM vivi_messages WHERE device_id = %s AND queued = 1 ORDER BY id ASC LIMIT %s",
+        (device_id, limit),
+    )
+    ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    connection.close()
+    return ids
+
+
+def text_update(n):
+    return json.dumps(
+        {
+            "update_id": n,
+            "message": {
+                "message_id": n,
+                "date": int(time.time()),
+                "chat": {"id": BENCH_SENDER, "type": "private"},
+                "from": {"id": BENCH_SENDER, "is_bot": False, "first_name": "Bench", "last_name": "Sender"},
+                "text": f"Goodnight Vivi #{n}",
+            },
+        }
+    )
+
+
+def scenarios(client, token, ack_ids, rng, episodes):
+    """Map of scenario name to a zero-argument callable making one request."""
+    auth = {"Authorization": f"Bearer {token}"}
+    acks = iter(ack_ids)
+    counter = iter(range(10**9))
+    random_form = {
+        "action": "get_random_episode",
+        "username": BENCH_USERNAME,
+        "is_live": "live",
+        "presenters": ["Dan"],
+        "exclude_months": "all",
+    }
+
+    def mark_then_remove():
+        episode_id = str(rng.randint(1, episodes))
+        client.post("/fish", data={"action": "mark_listened", "username": BENCH_USERNAME, "episode_id": episode_id})
+        return client.post(
+            "/fish", data={"action": "remove_listened", "username": BENCH_USERNAME, "episode_id": episode_id}
+        )
+
+    return {
+        "fish_get": lambda: client.get("/fish"),
+        "fish_random_episode": lambda: client.post("/fish", data=random_form),
+        "fish_random_episode_6_months": lambda: client.post("/fish", data=dict(random_form, exclude_months="6")),
+        "fish_load_episode": lambda: client.post(
+            "/fish", data={"action": "load_episode", "episode_number": str(rng.randint(1, episodes))}
+        ),
+        "fish_see_listened": lambda: client.post(
+            "/fish", data={"action": "see_listened", "username": BENCH_USERNAME}
+        ),
+        "fish_mark_and_remove_listened": mark_then_remove,
+        "vivi_get_post": lambda: client.get("/vivi/get_post", headers=auth),
+        "vivi_listen_post": lambda: client.delete(f"/vivi/listen_post/{next(acks)}", headers=auth),
+        "vivi_nightlight": lambda: client.get("/vivi/nightlight", headers=auth),
+        "vivi_telegram_webhook": lambda: client.post(
+            "/vivi/telegram", data=text_update(next(counter)), content_type="application/json"
+        ),
+    }
+
+
+def measure(request, iterations, warmup):
+    for _ in range(warmup):
+        request()
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        resp = request()
+        latencies.append(time.perf_counter() - t0)
+        if resp.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "n": iterations,
+        "errors": errors,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "throughput_rps": round(iterations / elapsed, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'scenario':<32}{'p50 Δ':>10}{'p99 Δ':>10}{'rps Δ':>10}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"{name:<32}{'new':>10}")
+            continue
+        deltas = [
+            (current[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            for key in ("p50_ms", "p99_ms", "throughput_rps")
+        ]
+        print(f"{name:<32}" + "".join(f"{delta:>+9.1f}%" for delta in deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="flask_railway_bench", help="scratch database, dropped and recreated")
+    parser.add_argument("--episodes", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=3000, help="listened episodes for the bench user")
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=50000, help="queued messages across all devices")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--only", action="append", help="run just this scenario (repeatable)")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "latest.json"))
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    if args.database == os.getenv("MYSQL_DATABASE"):
+        parser.error("--database must not be the app's own MYSQL_DATABASE")
+
+    rng = random.Random(args.seed)
+    print(f"Building {args.database}...")
+    create_database(args.database)
+
+    telegram, telegram_url = start_stub(TelegramStub)
+    openai, openai_url = start_stub(OpenAIStub)
+    bunny, bunny_url = start_stub(BunnyStub)
+
+    # The app reads these at import time, so set them before importing it
+    os.environ.update(
+        MYSQL_DATABASE=args.database,
+        TELEGRAM_BOT_TOKEN="123456:benchmark",
+        TELEGRAM_API_URL=telegram_url,
+        OPENAI_API_URL=openai_url,
+        OPENAI_API_KEY="benchmark",
+        BUNNY_STORAGE_HOST=bunny_url,
+        BUNNY_STORAGE_ZONE="bench",
+        ENABLED_FEATURES="vivi,fish",
+    )
+
+    print("Seeding...")
+    bench_device_id, token = seed(args.database, args, rng)
+    ack_ids = queued_message_ids(args.database, bench_device_id, args.iterations + args.warmup)
+
+    from main import create_app
+
+    client = create_app().test_client()
+    results = {}
+    for name, request in scenarios(client, token, ack_ids, rng, args.episodes).items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(request, args.iterations, args.warmup)
+        r = results[name]
+        print(
+            f"{name:<32} p50 {r['p50_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  "
+            f"{r['throughput_rps']:8.1f} req/s  errors {r['errors']}"
+        )
+
+    for server in (telegram, openai, bunny):
+        server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "params": {
+                key: getattr(args, key)
+                for key in ("episodes", "history", "devices", "messages", "iterations", "warmup", "seed")
+            },
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
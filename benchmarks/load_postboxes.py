@@ -0,0 +1,143 @@
+"""
+Load test for multi-postbox polling.
+
+Registers N devices, queues M messages on each, then drains every device's
+queue by polling /vivi/get_post and acking with /vivi/listen_post until it is
+empty - the same loop the Raspberry Pi runs. Checks that every device only
+ever sees its own messages and reports latency percentiles.
+
+At most --concurrency devices poll at once. Each of them holds up to two
+MySQL connections (token lookup, then the query), so keep 2 x concurrency
+under the server's max_connections (151 by default); otherwise connection
+errors show up as 500s instead of load.
+
+Needs the usual MYSQL* environment variables pointing at a disposable
+database with the 001_multi_postbox migration applied. Telegram
+notifications on ack are disabled so the run never leaves the machine.
+
+    python -m benchmarks.load_postboxes --devices 300 --messages 20 --concurrency 50
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database.database import connect_db
+from database.devices import register_device
+
+
+def seed(devices, messages_per_device):
+    """Register devices, one verified sender each, and queue their messages."""
+    run_id = uuid.uuid4().hex[:8]
+    seeded = []
+    connection = connect_db()
+    cursor = connection.cursor()
+    for i in range(devices):
+        device_id, token = register_device(f"load-{run_id}-{i}")
+        sender = f"load-{run_id}-{i}"
+        cursor.execute(
+            "INSERT INTO vivi_users (phone, verified, blocked, device_id) VALUES (%s, 1, 0, %s)", (sender, device_id)
+        )
+        rows = [
+            (f"message {n}", datetime.utcnow(), "text", "Load Test", sender, None, device_id)
+            for n in range(messages_per_device)
+        ]
+        cursor.executemany(
+            """
+            INSERT INTO vivi_messages
+                (message, received_at, type, sender_name, sender_number, mp3_url, listened, device_id, queued)
+            VALUES (%s, %s, %s, %s, %s, %s, 0, %s, 1)
+            """,
+            rows,
+        )
+        seeded.append((device_id, token, sender))
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return seeded
+
+
+def poll_device(app, token, sender, expected, latencies, errors):
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    received = 0
+    while True:
+        start = time.perf_counter()
+        resp = client.get("/vivi/get_post", headers=headers)
+        latencies["get_post"].append(time.perf_counter() - start)
+        if resp.status_code == 404:
+            break
+        if resp.status_code != 200:
+            errors.append(f"get_post returned {resp.status_code}")
+            break
+
+        message = resp.get_json()
+        if message["sender_name"] != "Load Test":
+            errors.append(f"device for {sender} received a foreign message {message['id']}")
+
+        start = time.perf_counter()
+        resp = client.delete(f"/vivi/listen_post/{message['id']}", headers=headers)
+        latencies["listen_post"].append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            errors.append(f"listen_post returned {resp.status_code}")
+            break
+        received += 1
+
+    if received != expected:
+        errors.append(f"{sender} drained {received} of {expected} messages")
+
+
+def report(name, samples):
+    if not samples:
+        print(f"{name}: no samples")
+        return
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    print(f"{name}: n={len(samples)} p50={p50:.1f}ms p99={p99:.1f}ms max={samples[-1] * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10, help="queued messages per device")
+    parser.add_argument("--concurrency", type=int, default=50, help="devices polling at once")
+    args = parser.parse_args()
+
+    from main import app
+    from routes.vivi_bot import get_bot
+
+    # Acks notify the sender on Telegram; the seeded senders are not real users
+    get_bot().send_message = lambda *a, **kw: None
+
+    print(f"Seeding {args.devices} devices x {args.messages} messages...")
+    seeded = seed(args.devices, args.messages)
+
+    latencies = {"get_post": [], "listen_post": []}
+    errors = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        polls = [
+            pool.submit(poll_device, app, token, sender, args.messages, latencies, errors)
+            for _, token, sender in seeded
+        ]
+        for poll in polls:
+            poll.result()
+    elapsed = time.perf_counter() - start
+
+    total = len(latencies["get_post"]) + len(latencies["listen_post"])
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.0f} req/s)")
+    report("get_post", latencies["get_post"])
+    report("listen_post", latencies["listen_post"])
+
+    if errors:
+        print(f"❌ {len(errors)} errors, first: {errors[0]}")
+        raise SystemExit(1)
+    print("✅ every device drained exactly its own queue")
+
+
+if __name__ == "__main__":
+    main()
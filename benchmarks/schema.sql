@@ -0,0 +1,51 @@
+-- Base tables as they existed before database/migrations, reconstructed from
+-- the queries in database/ and routes/. Only used to build benchmark databases.
+
+CREATE TABLE users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(64) NOT NULL,
+    UNIQUE KEY uq_users_username (username)
+);
+
+CREATE TABLE fish_episodes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    number INT NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    presenters VARCHAR(255) NOT NULL,
+    location VARCHAR(255),
+    date DATE,
+    is_live VARCHAR(16) NOT NULL,
+    KEY idx_fish_episodes_number (number)
+);
+
+CREATE TABLE fish_listening_history (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    episode_id INT NOT NULL,
+    listened_at DATETIME NOT NULL,
+    KEY idx_fish_listening_history_user (user_id, listened_at)
+);
+
+CREATE TABLE vivi_users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    phone VARCHAR(32) NOT NULL,
+    verified TINYINT(1) NOT NULL DEFAULT 0,
+    blocked TINYINT(1) NOT NULL DEFAULT 0,
+    message_id INT NULL
+);
+
+CREATE TABLE vivi_messages (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    message TEXT,
+    received_at DATETIME NOT NULL,
+    type VARCHAR(16) NOT NULL,
+    sender_name VARCHAR(255),
+    sender_number VARCHAR(32) NOT NULL,
+    mp3_url VARCHAR(512),
+    listened TINYINT(1) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE vivi_nightlight (
+    id INT PRIMARY KEY,
+    expires_at DATETIME NOT NULL
+);
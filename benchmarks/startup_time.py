@@ -0,0 +1,68 @@
+"""
+Startup-time benchmark for the app factory.
+
+Times `import main` in fresh interpreters for each feature set, plus an
+"eager" run that also builds the Telegram bot at import like the app used
+to, and reports the median wall time and which heavy modules got loaded.
+
+    python -m benchmarks.startup_time --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("telebot", "ffmpeg", "requests")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+if {eager}:
+    from routes.vivi_bot import get_bot
+    get_bot()
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+SCENARIOS = (
+    ("fish only", "fish", False),
+    ("vivi + fish (lazy bot)", "vivi,fish", False),
+    ("vivi + fish (eager bot)", "vivi,fish", True),
+)
+
+
+def run_once(features, eager):
+    env = dict(os.environ, ENABLED_FEATURES=features)
+    # TeleBot validates the token format when it is constructed
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+    probe = PROBE.format(eager=eager, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    medians = {}
+    for name, features, eager in SCENARIOS:
+        results = [run_once(features, eager) for _ in range(args.runs)]
+        medians[name] = statistics.median(r["seconds"] for r in results) * 1000
+        loaded = ", ".join(results[-1]["loaded"]) or "none"
+        print(f"{name:<26} median {medians[name]:7.1f}ms  heavy modules loaded: {loaded}")
+
+    eager_ms = medians["vivi + fish (eager bot)"]
+    for name in ("fish only", "vivi + fish (lazy bot)"):
+        saved = eager_ms - medians[name]
+        print(f"{name} saves {saved:.1f}ms ({saved / eager_ms * 100:.0f}%) per worker vs eager")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Local stand-ins for the HTTP services the vivi blueprint calls.
+
+Each stub answers with just enough JSON for the app's client code to parse,
+after an optional delay that simulates a slow upstream.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base stub: drains the request body, sleeps for `delay`, then replies."""
+
+    delay = 0.0
+    status = 200
+    content_type = "application/json"
+
+    def body(self):
+        return b"{}"
+
+    def handle_any(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        time.sleep(self.delay)
+        body = self.body()
+        self.send_response(self.status)
+        self.send_header("Content-Type", self.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = handle_any
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TelegramStub(StubHandler):
+    """Fake Telegram Bot API: every method succeeds and returns a message."""
+
+    def body(self):
+        message = {"message_id": 1, "date": int(time.time()), "chat": {"id": 1, "type": "private"}}
+        return json.dumps({"ok": True, "result": message}).encode("utf-8")
+
+
+class OpenAIStub(StubHandler):
+    """Fake OpenAI speech endpoint returning a few KB of pretend MP3."""
+
+    content_type = "audio/mpeg"
+
+    def body(self):
+        return b"ID3" + b"\x00" * 4096
+
+
+class BunnyStub(StubHandler):
+    """Fake Bunny storage zone accepting every upload."""
+
+    status = 201
+
+    def body(self):
+        return b'{"HttpCode": 201, "Message": "File uploaded."}'
+
+
+def start_stub(handler=TelegramStub, delay=0.0):
+    """Serve `handler` on a free localhost port in a daemon thread; returns (server, base_url)."""
+    handler_class = type(handler.__name__, (handler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -1,9 +1,14 @@
 import mysql.connector
+import logging
 import os
+import sys
 from datetime import datetime, timedelta
 import html
 import urllib.parse
 import random
+from observability.metrics import DB_CONNECT_LATENCY, DB_QUERY_LATENCY, timed
+
+logger = logging.getLogger(__name__)
 
 # Load database credentials from environment variables
 DB_HOST = os.getenv("MYSQLHOST")
@@ -11,17 +16,56 @@ DB_USER = os.getenv("MYSQLUSER")
 DB_PASSWORD = os.getenv("MYSQL_ROOT_PASSWORD")
 DB_PORT = os.getenv("MYSQLPORT")
 DB_NAME = os.getenv("MYSQL_DATABASE")
+# The pure-Python driver does its I/O through the socket module, so gevent can
+# switch greenlets while a query waits; the C extension would block the worker
+DB_USE_PURE = os.getenv("MYSQL_USE_PURE") == "1"
+
+
+class TimedCursor:
+    """Cursor wrapper that times each query against the function that issued it."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        helper = sys._getframe(1).f_code.co_name
+        with timed(DB_QUERY_LATENCY, f"db.{helper}", helper=helper):
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        helper = sys._getframe(1).f_code.co_name
+        with timed(DB_QUERY_LATENCY, f"db.{helper}", helper=helper):
+            return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Connection wrapper whose cursors are TimedCursors."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._connection.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
 
 
 def connect_db():
     """Helper function to connect to the database."""
-    return mysql.connector.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        port=DB_PORT,
-        database=DB_NAME,
-    )
+    with timed(DB_CONNECT_LATENCY, "db.connect"):
+        connection = mysql.connector.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT,
+            database=DB_NAME,
+            use_pure=DB_USE_PURE,
+        )
+    return TimedConnection(connection)
 
 
 def fish_user_exists(username):
@@ -33,8 +77,8 @@ def fish_user_exists(username):
         cursor.execute(query, (username,))
         result = cursor.fetchone()
         return result[0] > 0
-    except Exception as err:
-        print(f"Error: {err}")
+    except Exception:
+        logger.exception("Database error")
         return False
     finally:
         cursor.close()
@@ -56,8 +100,8 @@ def get_listened_episodes(username):
         """
         cursor.execute(query, (username,))
         return cursor.fetchall()
-    except Exception as err:
-        print(f"Error: {err}")
+    except Exception:
+        logger.exception("Database error")
         return []
     finally:
         cursor.close()
@@ -77,8 +121,8 @@ def remove_listened_episode(username, episode_id):
         """
         cursor.execute(query, (username, episode_id))
         conn.commit()
-    except Exception as err:
-        print(f"Error: {err}")
+    except Exception:
+        logger.exception("Database error")
     finally:
         cursor.close()
         conn.close()
@@ -130,8 +174,8 @@ def get_filtered_random_episode(is_live_filter, selected_presenters, username, e
 
         return random.choice(episodes) if episodes else None
 
-    except Exception as err:
-        print(f"Error: {err}")
+    except Exception:
+        logger.exception("Database error")
         return None
     finally:
         cursor.close()
@@ -151,8 +195,8 @@ def mark_episode_listened(username, episode_id):
         """
         cursor.execute(query, (username, episode_id, datetime.now()))
         conn.commit()
-    except Exception as err:
-        print(f"Error: {err}")
+    except Exception:
+        logger.exception("Database error")
     finally:
         cursor.close()
         conn.close()
@@ -166,8 +210,8 @@ def get_episode_by_number(episode_number):
         query = "SELECT * FROM fish_episodes WHERE number = %s"
         cursor.execute(query, (episode_number,))
         return cursor.fetchone()
-    except Exception as err:
-        print(f"Error: {err}")
+    except Exception:
+        logger.exception("Database error")
         return None
     finally:
         cursor.close()
@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import secrets
+from datetime import datetime
+from database.database import connect_db
+
+logger = logging.getLogger(__name__)
+
+# Messages and nightlight rows written before multi-postbox support belong to this device
+DEFAULT_DEVICE_ID = 1
+
+
+def hash_token(token):
+    """Hash a device API token for storage and lookup."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def register_device(name):
+    """Create a new postbox device and return (device_id, token).
+
+    The plain token is only ever returned here; the database stores its hash.
+    """
+    token = secrets.token_urlsafe(32)
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
+        query = "INSERT INTO vivi_devices (name, token_hash, created_at) VALUES (%s, %s, %s)"
+        cursor.execute(query, (name, hash_token(token), datetime.utcnow()))
+        conn.commit()
+        return cursor.lastrowid, token
+    except Exception:
+        logger.exception("Database error")
+        return None, None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_device_by_token(token):
+    """Look up the device owning an API token via the unique token_hash index.
+
+    Returns None only when no device has this token. Database errors are raised,
+    so a failed lookup isn't mistaken for an invalid token.
+    """
+    conn = connect_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        query = "SELECT id, name FROM vivi_devices WHERE token_hash = %s"
+        cursor.execute(query, (hash_token(token),))
+        device = cursor.fetchone()
+        cursor.close()
+        return device
+    finally:
+        conn.close()
+
+
+def get_device_by_name(name):
+    """Retrieve a device by its unique name."""
+    try:
+        conn = connect_db()
+        cursor = conn.cursor(dictionary=True)
+        query = "SELECT id, name FROM vivi_devices WHERE name = %s"
+        cursor.execute(query, (name,))
+        return cursor.fetchone()
+    except Exception:
+        logger.exception("Database error")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def list_devices():
+    """Fetch all registered devices, oldest first."""
+    try:
+        conn = connect_db()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id, name FROM vivi_devices ORDER BY id ASC")
+        return cursor.fetchall()
+    except Exception:
+        logger.exception("Database error")
+        return []
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def assign_sender_device(phone, device_id):
+    """Route a sender's future messages to a device, creating an unverified user if needed."""
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
+        # A single upsert on the unique phone key, so concurrent calls can't create duplicate users
+        query = """
+        INSERT INTO vivi_users (phone, verified, blocked, device_id)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE device_id = VALUES(device_id)
+        """
+        cursor.execute(query, (phone, False, False, device_id))
+        conn.commit()
+        return True
+    except Exception:
+        logger.exception("Database error")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
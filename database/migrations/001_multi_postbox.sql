@@ -0,0 +1,42 @@
+-- Multi-postbox support: device registration, per-device queues and nightlight state.
+-- Existing rows are attached to device 1, which is the first device registered
+-- with /register_device on an empty vivi_devices table.
+
+CREATE TABLE IF NOT EXISTS vivi_devices (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(64) NOT NULL,
+    token_hash CHAR(64) NOT NULL,
+    created_at DATETIME NOT NULL,
+    UNIQUE KEY uq_vivi_devices_name (name),
+    UNIQUE KEY uq_vivi_devices_token_hash (token_hash)
+);
+
+-- Which device a sender's messages are delivered to (NULL means device 1)
+ALTER TABLE vivi_users ADD COLUMN device_id INT NULL;
+
+ALTER TABLE vivi_messages ADD COLUMN device_id INT NOT NULL DEFAULT 1;
+
+-- queued = 1 while a message is unlistened and its sender is verified and not
+-- blocked. It is kept up to date on insert, verify, block and listen, so the
+-- queue index below holds exactly the deliverable messages.
+ALTER TABLE vivi_messages ADD COLUMN queued TINYINT(1) NOT NULL DEFAULT 0;
+
+-- One row per sender, so sender joins and upserts are unambiguous. Remove any
+-- duplicate phones before running this.
+ALTER TABLE vivi_users ADD UNIQUE KEY uq_vivi_users_phone (phone);
+
+UPDATE vivi_messages m
+JOIN vivi_users u ON m.sender_number = u.phone
+SET m.queued = 1
+WHERE m.listened = 0 AND u.verified = 1 AND u.blocked = 0;
+
+-- get_post seeks (device_id, queued = 1) and reads the first id without
+-- skipping anything; listen_post and get_post/<id> hit the primary key and
+-- check device_id on the same row.
+CREATE INDEX idx_vivi_messages_queue ON vivi_messages (device_id, queued, id);
+
+-- Verifying or blocking a sender updates their unlistened messages through this index
+CREATE INDEX idx_vivi_messages_sender ON vivi_messages (sender_number, listened);
+
+-- vivi_nightlight keeps one row per device, keyed by the device id (the old
+-- single row with id = 1 becomes device 1's state).
@@ -0,0 +1,70 @@
+import gc
+import logging
+import os
+import shutil
+import tempfile
+
+# gunicorn loads this file as "__config__"
+logger = logging.getLogger("gunicorn.conf")
+
+bind = "0.0.0.0:8080"
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+
+# "sync" gives each request a whole worker. "gevent" runs up to
+# worker_connections requests per worker as greenlets, so requests waiting on
+# Telegram, OpenAI, Bunny or MySQL no longer hold a worker each.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+if worker_class == "gevent":
+    # serve.py patches before gunicorn imports ssl; patching here would be too late
+    from gevent import monkey
+
+    if not monkey.is_module_patched("ssl"):
+        raise RuntimeError("Start gevent mode with `python serve.py main:app`, not the gunicorn command")
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+    os.environ.setdefault("MYSQL_USE_PURE", "1")
+
+loglevel = "debug"
+accesslog = "-"
+errorlog = "-"
+
+# Load main:app once in the master and fork workers from it, so imported
+# modules are shared copy-on-write instead of being rebuilt in every worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# Workers write metrics here so /metrics can merge them. It has to exist,
+# emptied of the previous run's files, before the preloaded app imports
+# prometheus_client.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "flask_railway_metrics"))
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before any worker is forked."""
+    if not preload_app:
+        return
+
+    from main import enabled_features
+
+    if "vivi" in enabled_features():
+        # Pay for telebot, ffmpeg and requests once here rather than on each
+        # worker's first webhook
+        try:
+            from routes.vivi_bot import warm
+
+            warm()
+        except Exception:
+            # A missing telebot/ffmpeg or a malformed token should only break
+            # the vivi endpoints, not stop the master from forking workers
+            logger.exception("Could not warm up the Telegram bot")
+
+    # Move everything allocated so far out of the GC's reach; otherwise the
+    # first collection in each worker touches every object and un-shares the pages
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    """Fold a dead worker's live gauges out of the merged metrics."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,21 +1,67 @@
+import os
 from flask import Flask
-from routes.vivi import vivi
-from routes.fish import fish
+from observability.logs import configure_logging
+from observability.metrics import instrument_app
+from observability.profiling import init_profiling
 
-app = Flask(
-    __name__,
-    template_folder="templates",
-    static_folder="static",
-)
+# Blueprints that can be switched on, e.g. ENABLED_FEATURES=fish for a fish-only worker
+FEATURES = ("vivi", "fish", "metrics", "admin")
 
-# Register Blueprints
-app.register_blueprint(vivi)
-app.register_blueprint(fish)
 
+def enabled_features():
+    """Read the ENABLED_FEATURES env var, defaulting to every feature."""
+    value = os.getenv("ENABLED_FEATURES")
+    if value is None:
+        return list(FEATURES)
+    return [feature.strip() for feature in value.split(",") if feature.strip()]
 
-@app.route("/")
-def index():
-    return {"message": "Welcome to the Flask app. Try /vivi or /fish routes."}
+
+def create_app(features=None):
+    """Build the Flask app, importing and registering only the requested blueprints."""
+    if features is None:
+        features = enabled_features()
+
+    unknown = set(features) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown features: {', '.join(sorted(unknown))}")
+
+    configure_logging()
+
+    app = Flask(
+        __name__,
+        template_folder="templates",
+        static_folder="static",
+    )
+    instrument_app(app)
+    init_profiling(app)
+
+    # Register Blueprints
+    if "vivi" in features:
+        from routes.vivi import vivi
+
+        app.register_blueprint(vivi)
+    if "fish" in features:
+        from routes.fish import fish
+
+        app.register_blueprint(fish)
+    if "metrics" in features:
+        from routes.metrics import metrics
+
+        app.register_blueprint(metrics)
+    if "admin" in features:
+        from routes.admin import admin
+
+        app.register_blueprint(admin)
+
+    @app.route("/")
+    def index():
+        routes = " or ".join(f"/{feature}" for feature in features)
+        return {"message": f"Welcome to the Flask app. Try {routes} routes."}
+
+    return app
+
+
+app = create_app()
 
 
 if __name__ == "__main__":
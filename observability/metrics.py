@@ -0,0 +1,103 @@
+"""
+Prometheus metrics for the app.
+
+Under gunicorn each worker writes its samples to files in
+PROMETHEUS_MULTIPROC_DIR (set up by gunicorn.conf.py), and /metrics merges
+them, so a scrape reports every worker whichever one answers it.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from observability.profiling import record_span
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by Flask endpoint (blueprint.view).",
+    ["endpoint", "method", "status"],
+)
+DB_CONNECT_LATENCY = Histogram("db_connect_duration_seconds", "Time to open a MySQL connection.")
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Query latency by the helper function that issued it.",
+    ["helper"],
+)
+FFMPEG_DURATION = Histogram(
+    "ffmpeg_transcode_duration_seconds",
+    "OGG to MP3 transcode time.",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+FFMPEG_BYTES = Counter("ffmpeg_transcode_bytes_total", "Audio bytes into and out of ffmpeg.", ["direction"])
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Outbound call latency by service and outcome (ok, failed or error).",
+    ["service", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+
+@contextmanager
+def timed(histogram, span=None, **labels):
+    """Observe the duration of the block; the block may update the yielded labels.
+
+    If `span` is given, the block is also recorded as a span of a profiled request.
+    """
+    start = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        duration = time.perf_counter() - start
+        # Unlabeled histograms such as DB_CONNECT_LATENCY reject .labels()
+        (histogram.labels(**labels) if labels else histogram).observe(duration)
+        if span:
+            record_span(span, duration)
+
+
+def instrument_app(app):
+    """Record REQUEST_LATENCY for every request the app serves."""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        observe_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        # after_request is skipped when a view raises
+        if exc is not None:
+            observe_request(500)
+
+
+def observe_request(status):
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return
+    # Unmatched URLs share one label so scanners can't blow up the series count
+    endpoint = request.endpoint or "unmatched"
+    REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method, status=str(status)).observe(
+        time.perf_counter() - start
+    )
+
+
+def render_metrics():
+    """Return (body, content_type) for a scrape, merged across workers when running multiprocess."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
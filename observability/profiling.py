@@ -0,0 +1,266 @@
+"""
+Opt-in per-request profiling and slow-request capture.
+
+A request is profiled when an admin sends `X-Profile: 1` (or `X-Profile: flame`)
+with a valid `X-Admin-Token`, or when PROFILE_SAMPLE_RATE picks it. Profiled
+requests collect a span for every timed() block (DB connects and queries, TTS,
+uploads) plus ffmpeg and template rendering. `flame` also samples the request
+thread's stack and keeps it in folded format for flamegraph.pl or speedscope;
+sampling only sees the request under sync workers.
+
+Captures are JSON files in PROFILE_CAPTURE_DIR, shared by every gunicorn
+worker, in two ring buffers of CAPTURE_BUFFER_SIZE entries each:
+
+- "slow": requests slower than SLOW_REQUEST_MS, with spans if they were sampled,
+- "profiled": requests an admin asked to profile, which also get their spans
+  back in a Server-Timing header and their capture id in X-Profile-Id.
+
+Sampled requests that turn out fast are dropped, so sampling never pushes slow
+requests out of the buffer and never exposes span names to ordinary clients.
+
+When a request is not profiled, the only cost is a header lookup, a clock
+read and a comparison.
+"""
+
+import hmac
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+CAPTURE_BUFFER_SIZE = int(os.getenv("CAPTURE_BUFFER_SIZE", "100"))
+CAPTURE_DIR = os.getenv("PROFILE_CAPTURE_DIR", os.path.join(tempfile.gettempdir(), "flask_railway_captures"))
+CAPTURE_KINDS = ("slow", "profiled")
+SAMPLER_INTERVAL = float(os.getenv("PROFILE_SAMPLER_INTERVAL_MS", "5")) / 1000
+
+# Capture ids are "<epoch ms>-<pid>-<n>": unique across forked workers and sortable by age
+_CAPTURE_ID = re.compile(r"^\d+-\d+-\d+$")
+_capture_counter = itertools.count(1)
+
+
+def is_admin_request():
+    """True if the request carries the ADMIN_API_TOKEN (never true while it is unset)."""
+    token = request.headers.get("X-Admin-Token")
+    # compare_digest rejects str with non-ASCII characters, so compare bytes
+    return bool(ADMIN_API_TOKEN and token and hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode()))
+
+
+class StackSampler:
+    """Samples one thread's stack from a background thread and counts identical stacks."""
+
+    def __init__(self, thread_id, interval=SAMPLER_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        """Stacks in Brendan Gregg's folded format, one `frame;frame;frame count` per line."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Spans, and optionally stack samples, collected for one request."""
+
+    def __init__(self, flame=False, by_admin=False):
+        self.start = time.perf_counter()
+        self.spans = []
+        # Only admin-requested profiles are returned to the client and kept when fast
+        self.by_admin = by_admin
+        self.sampler = StackSampler(threading.get_ident()) if flame else None
+        if self.sampler:
+            self.sampler.start()
+
+    def add_span(self, name, duration):
+        offset = time.perf_counter() - duration - self.start
+        self.spans.append({"name": name, "start_ms": round(offset * 1000, 3), "ms": round(duration * 1000, 3)})
+
+    def stop(self):
+        if self.sampler:
+            self.sampler.stop()
+
+    def server_timing(self, total):
+        """Server-Timing header value with spans summed by name."""
+        totals = {}
+        for s in self.spans:
+            ms, count = totals.get(s["name"], (0.0, 0))
+            totals[s["name"]] = (ms + s["ms"], count + 1)
+        parts = [f'{name};dur={ms:.1f};desc="{count}x"' for name, (ms, count) in totals.items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def current_profile():
+    if not has_request_context():
+        return None
+    return g.get("profile")
+
+
+def record_span(name, duration):
+    """Attach a finished span to the current request's profile, if it is being profiled."""
+    profile = current_profile()
+    if profile is not None:
+        profile.add_span(name, duration)
+
+
+@contextmanager
+def span(name):
+    """Time the block as a span of the current request's profile."""
+    if current_profile() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def init_profiling(app):
+    """Install the hooks that start profiles and capture slow requests."""
+
+    @app.before_request
+    def start_profile():
+        g.profile_start = time.perf_counter()
+        mode = request.headers.get("X-Profile")
+        if mode and is_admin_request():
+            g.profile = RequestProfile(flame=mode == "flame", by_admin=True)
+        elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            g.profile = RequestProfile()
+
+    @app.after_request
+    def finish_profile(response):
+        capture_request(response.status_code, response)
+        return response
+
+    @app.teardown_request
+    def finish_failed_profile(exc):
+        # after_request is skipped when a view raises
+        if exc is not None:
+            capture_request(500, None)
+
+
+def capture_request(status, response):
+    start = g.pop("profile_start", None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.stop()
+
+    slow = duration * 1000 >= SLOW_REQUEST_MS
+    kinds = [kind for kind, wanted in (("slow", slow), ("profiled", profile and profile.by_admin)) if wanted]
+    if not kinds:
+        return
+
+    entry = {
+        "id": f"{int(time.time() * 1000)}-{os.getpid()}-{next(_capture_counter)}",
+        "pid": os.getpid(),
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": status,
+        "duration_ms": round(duration * 1000, 3),
+        "slow": slow,
+        "spans": None,
+        "flame": None,
+    }
+    if profile is not None:
+        entry["spans"] = profile.spans
+        if profile.sampler:
+            entry["flame"] = profile.sampler.folded()
+        if profile.by_admin and response is not None:
+            response.headers["Server-Timing"] = profile.server_timing(duration)
+            response.headers["X-Profile-Id"] = entry["id"]
+
+    for kind in kinds:
+        save_capture(kind, entry)
+
+
+# --- CAPTURE STORE ---
+def _capture_key(name):
+    return tuple(int(part) for part in name[: -len(".json")].split("-"))
+
+
+def _capture_files(kind):
+    """Capture file names of one kind, oldest first."""
+    try:
+        names = [name for name in os.listdir(os.path.join(CAPTURE_DIR, kind)) if name.endswith(".json")]
+    except FileNotFoundError:
+        return []
+    return sorted(names, key=_capture_key)
+
+
+def _read_capture(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        # Pruned by another worker, or not a capture
+        return None
+
+
+def save_capture(kind, entry):
+    """Write a capture where every worker can read it, then trim the kind to CAPTURE_BUFFER_SIZE."""
+    directory = os.path.join(CAPTURE_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{entry['id']}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(entry, f)
+    os.replace(f"{path}.tmp", path)
+
+    for name in _capture_files(kind)[:-CAPTURE_BUFFER_SIZE]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_captures(kind):
+    """Every worker's captures of one kind, newest first."""
+    entries = (_read_capture(os.path.join(CAPTURE_DIR, kind, name)) for name in reversed(_capture_files(kind)))
+    return [entry for entry in entries if entry]
+
+
+def load_capture(capture_id):
+    """Find a capture by id in any buffer, or None."""
+    if not _CAPTURE_ID.match(capture_id):
+        return None
+    for kind in CAPTURE_KINDS:
+        entry = _read_capture(os.path.join(CAPTURE_DIR, kind, f"{capture_id}.json"))
+        if entry:
+            return entry
+    return None
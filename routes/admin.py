@@ -0,0 +1,53 @@
+from flask import Blueprint, Response, jsonify
+from observability.profiling import is_admin_request, list_captures, load_capture
+
+admin = Blueprint("admin", __name__)
+
+
+@admin.before_request
+def require_admin_token():
+    if not is_admin_request():
+        return jsonify({"status": "error", "message": "Forbidden"}), 403
+
+
+def summaries(kind):
+    """Captures of one kind from every worker, newest first, without spans or stacks."""
+    return jsonify(
+        [
+            dict(
+                {key: value for key, value in entry.items() if key not in ("spans", "flame")},
+                has_spans=entry["spans"] is not None,
+                has_flame=entry["flame"] is not None,
+            )
+            for entry in list_captures(kind)
+        ]
+    )
+
+
+@admin.route("/admin/slow_requests", methods=["GET"])
+def list_slow_requests():
+    """Requests slower than SLOW_REQUEST_MS."""
+    return summaries("slow")
+
+
+@admin.route("/admin/profiled_requests", methods=["GET"])
+def list_profiled_requests():
+    """Requests profiled on demand with X-Profile."""
+    return summaries("profiled")
+
+
+@admin.route("/admin/requests/<capture_id>", methods=["GET"])
+def get_captured_request(capture_id):
+    entry = load_capture(capture_id)
+    if not entry:
+        return "Request not found", 404
+    return jsonify({key: value for key, value in entry.items() if key != "flame"})
+
+
+@admin.route("/admin/requests/<capture_id>/flame", methods=["GET"])
+def get_flame_graph(capture_id):
+    """Folded stacks, ready for flamegraph.pl or speedscope."""
+    entry = load_capture(capture_id)
+    if not entry or entry["flame"] is None:
+        return "No flame graph for this request", 404
+    return Response(entry["flame"], content_type="text/plain")
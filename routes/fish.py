@@ -1,4 +1,5 @@
 from flask import Blueprint, request, render_template, make_response
+from observability.profiling import span
 from database.database import (
     fish_user_exists,
     get_listened_episodes,
@@ -53,19 +54,21 @@ def landing_page():
                 error = "Username not found. Please enter a valid username."
             else:
                 mark_episode_listened(username, episode_id)
-                resp.set_data(
-                    render_template(
-                        "fish.html",
-                        episode=None,
-                        presenters=["Dan", "Anna", "Andrew", "James"],
-                        username=username,
-                        is_live=is_live,
-                        selected_presenters=selected_presenters,
-                        exclude_months=exclude_months,
-                        listened_episodes=get_listened_episodes(username),
-                        success="Episode marked as listened!",
+                listened_episodes = get_listened_episodes(username)
+                with span("render.fish"):
+                    resp.set_data(
+                        render_template(
+                            "fish.html",
+                            episode=None,
+                            presenters=["Dan", "Anna", "Andrew", "James"],
+                            username=username,
+                            is_live=is_live,
+                            selected_presenters=selected_presenters,
+                            exclude_months=exclude_months,
+                            listened_episodes=listened_episodes,
+                            success="Episode marked as listened!",
+                        )
                     )
-                )
                 return resp
 
         # Fetch a random episode
@@ -84,17 +87,18 @@ def landing_page():
             else:
                 error = "Please enter an episode number."
 
-    resp.set_data(
-        render_template(
-            "fish.html",
-            episode=episode,
-            presenters=["Dan", "Anna", "Andrew", "James"],
-            username=username,
-            is_live=is_live,
-            selected_presenters=selected_presenters,
-            exclude_months=exclude_months,
-            listened_episodes=listened_episodes,
-            error=error,
+    with span("render.fish"):
+        resp.set_data(
+            render_template(
+                "fish.html",
+                episode=episode,
+                presenters=["Dan", "Anna", "Andrew", "James"],
+                username=username,
+                is_live=is_live,
+                selected_presenters=selected_presenters,
+                exclude_months=exclude_months,
+                listened_episodes=listened_episodes,
+                error=error,
+            )
         )
-    )
     return resp
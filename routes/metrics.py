@@ -0,0 +1,11 @@
+from flask import Blueprint, Response
+from observability.metrics import render_metrics
+
+metrics = Blueprint("metrics", __name__)
+
+
+@metrics.route("/metrics", methods=["GET"])
+def scrape():
+    """Prometheus scrape endpoint."""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
@@ -0,0 +1,446 @@
+"""
+Telegram side of Vivi's postbox: the bot, its handlers and the audio pipeline.
+
+Nothing here is imported until the first webhook or notification needs it, so
+workers that only serve /fish never load telebot, ffmpeg or requests.
+"""
+
+import telebot
+import logging
+import threading
+import time
+from telebot.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+import ffmpeg
+import io
+import requests
+import os
+from datetime import datetime, timedelta
+from database.database import connect_db
+from observability.metrics import FFMPEG_BYTES, FFMPEG_DURATION, UPSTREAM_LATENCY, timed
+from observability.profiling import record_span
+from database.devices import (
+    DEFAULT_DEVICE_ID,
+    register_device,
+    get_device_by_name,
+    list_devices,
+    assign_sender_device,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# Override to point the bot at another Bot API server, e.g. a local stub in benchmarks
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+BUNNY_STORAGE_ZONE = os.getenv("BUNNY_STORAGE_ZONE")
+BUNNY_API_KEY = os.getenv("BUNNY_API_KEY")
+BUNNY_PULL_URL = os.getenv("BUNNY_PULL_URL")
+BUNNY_STORAGE_HOST = os.getenv("BUNNY_STORAGE_HOST", "https://jh.storage.bunnycdn.com")
+BUNNY_STORAGE_URL = f"{BUNNY_STORAGE_HOST}/{BUNNY_STORAGE_ZONE}"
+
+DOMAIN = os.getenv("DOMAIN")
+ADMIN_TELEGRAM_IDS = [id.strip() for id in os.getenv("ADMIN_TELEGRAM_IDS", "").split(",") if id.strip()]
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1")
+OPENAI_TTS_VOICE = "nova"
+
+# --- BOT SETUP ---
+bot = None  # Built by get_bot() on first use
+_bot_lock = threading.Lock()
+
+
+def get_bot():
+    """Construct the TeleBot and register its handlers the first time it is needed."""
+    global bot
+    if bot is None:
+        with _bot_lock:
+            if bot is None:
+                if TELEGRAM_API_URL:
+                    telebot.apihelper.API_URL = TELEGRAM_API_URL + "/bot{0}/{1}"
+                    telebot.apihelper.FILE_URL = TELEGRAM_API_URL + "/file/bot{0}/{1}"
+                # Using threaded=False is important when running inside a Flask Blueprint
+                new_bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN, threaded=False)
+                register_handlers(new_bot)
+                bot = new_bot
+    return bot
+
+
+def process_update(json_string):
+    """Feed a raw webhook payload to the bot."""
+    update = telebot.types.Update.de_json(json_string)
+    get_bot().process_new_updates([update])
+
+
+def register_handlers(new_bot):
+    """Attach the handlers below, in the order Telegram updates should match them."""
+    new_bot.register_message_handler(
+        nightlight_trigger,
+        func=lambda message: str(message.from_user.id) in ADMIN_TELEGRAM_IDS
+        and message.text == "💡 Control Nightlight",
+    )
+    new_bot.register_callback_query_handler(handle_nightlight_selection, func=lambda call: call.data.startswith("nl_"))
+    new_bot.register_message_handler(handle_register_device, commands=["register_device"])
+    new_bot.register_message_handler(handle_choose_postbox, commands=["postbox"])
+    new_bot.register_message_handler(send_welcome, commands=["start"])
+    new_bot.register_message_handler(handle_incoming_message, content_types=["text", "voice"])
+
+
+def warm():
+    """Build the bot ahead of time, e.g. in the gunicorn master before forking."""
+    if TELEGRAM_BOT_TOKEN:
+        get_bot()
+
+
+# --- NIGHTLIGHT CONTROL ---
+def get_admin_keyboard():
+    """Big button keyboard at the bottom of the screen."""
+    markup = ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.add(KeyboardButton("💡 Control Nightlight"))
+    return markup
+
+
+def get_device_keyboard(devices):
+    """Buttons to pick which postbox the nightlight request is for."""
+    markup = InlineKeyboardMarkup()
+    # Callback data format: "nl_dev:DEVICE_ID"
+    for device in devices:
+        markup.add(InlineKeyboardButton(device["name"], callback_data=f"nl_dev:{device['id']}"))
+    markup.add(InlineKeyboardButton("❌ Cancel", callback_data="nl_cancel"))
+    return markup
+
+
+def get_duration_keyboard(device_id):
+    """Buttons that appear inside the chat message."""
+    markup = InlineKeyboardMarkup()
+    # Callback data format: "nl_hours:DEVICE_ID:X"
+    markup.add(
+        InlineKeyboardButton("1 Hour", callback_data=f"nl_hours:{device_id}:1"),
+        InlineKeyboardButton("2 Hours", callback_data=f"nl_hours:{device_id}:2"),
+    )
+    markup.add(
+        InlineKeyboardButton("4 Hours", callback_data=f"nl_hours:{device_id}:4"),
+        InlineKeyboardButton("8 Hours", callback_data=f"nl_hours:{device_id}:8"),
+    )
+    markup.add(InlineKeyboardButton("Turn off Nightlight", callback_data=f"nl_off:{device_id}"))
+    markup.add(InlineKeyboardButton("❌ Cancel", callback_data="nl_cancel"))
+    return markup
+
+
+def nightlight_trigger(message):
+    devices = list_devices()
+    if len(devices) > 1:
+        bot.send_message(message.chat.id, "Which postbox?", reply_markup=get_device_keyboard(devices))
+        return
+
+    device_id = devices[0]["id"] if devices else DEFAULT_DEVICE_ID
+    bot.send_message(
+        message.chat.id, "How long should the nightlight stay on for?", reply_markup=get_duration_keyboard(device_id)
+    )
+
+
+def handle_nightlight_selection(call):
+    if call.data == "nl_cancel":
+        bot.edit_message_text("Nightlight request cancelled.", call.message.chat.id, call.message.message_id)
+        return
+
+    # Device picked, now ask for the duration
+    if call.data.startswith("nl_dev:"):
+        device_id = int(call.data.split(":")[1])
+        bot.edit_message_text(
+            "How long should the nightlight stay on for?",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=get_duration_keyboard(device_id),
+        )
+        return
+
+    # 1. Determine the device and expiration datetime
+    # Buttons sent before multi-postbox support carry no device id ("nl_off", "nl_hours:4")
+    parts = call.data.split(":")
+    if parts[0] == "nl_off":
+        device_id = int(parts[1]) if len(parts) > 1 else DEFAULT_DEVICE_ID
+        expiration_dt = datetime.utcnow()  # Set to "now" to effectively turn it off
+        msg_text = "✅ Nightlight will turn OFF in the next 5 seconds."
+    else:
+        # Extract device and hours from callback_data (e.g., "nl_hours:2:4")
+        device_id = int(parts[1]) if len(parts) > 2 else DEFAULT_DEVICE_ID
+        hours = int(parts[-1])
+        expiration_dt = datetime.utcnow() + timedelta(hours=hours)
+        msg_text = f"✅ Nightlight will turn ON for {hours} hours in the next 5 seconds."
+
+    # 2. Update the Database
+    try:
+        connection = connect_db()
+        cursor = connection.cursor()
+
+        # The row id is the device id, one record per postbox
+        # ON DUPLICATE KEY UPDATE ensures we only ever have one row per device
+        query = """
+            INSERT INTO vivi_nightlight (id, expires_at) 
+            VALUES (%s, %s) 
+            ON DUPLICATE KEY UPDATE expires_at = %s
+        """
+        cursor.execute(query, (device_id, expiration_dt, expiration_dt))
+        connection.commit()
+
+        cursor.close()
+        connection.close()
+
+        # 3. Give feedback to the Admin
+        bot.edit_message_text(msg_text, call.message.chat.id, call.message.message_id)
+
+    except Exception:
+        logger.exception("Error saving nightlight to DB", extra={"device_id": device_id})
+        bot.answer_callback_query(call.id, "Error saving settings to database.")
+
+
+# --- CORE UTILITIES ---
+def upload_mp3_to_bunny(mp3_data, timestamp):
+    """Upload MP3 file to Bunny.net and return the public URL."""
+    try:
+        filename = f"audio_{timestamp}.mp3"
+        headers = {
+            "AccessKey": BUNNY_API_KEY,
+            "Content-Type": "application/octet-stream",
+            "accept": "application/json",
+        }
+
+        with timed(
+            UPSTREAM_LATENCY, "upstream.bunny_upload", service="bunny_upload", outcome="error"
+        ) as labels:
+            response = requests.put(f"{BUNNY_STORAGE_URL}/{filename}", headers=headers, data=mp3_data)
+            labels["outcome"] = "ok" if response.status_code == 201 else "failed"
+
+        if response.status_code != 201:
+            logger.error(
+                "Failed to upload MP3 to Bunny.net", extra={"status": response.status_code, "body": response.text}
+            )
+            return None
+
+        mp3_url = f"http://{BUNNY_PULL_URL}.b-cdn.net/{filename}"
+        logger.info("MP3 uploaded", extra={"mp3_url": mp3_url, "bytes": len(mp3_data)})
+
+        return mp3_url
+
+    except Exception:
+        logger.exception("Error uploading MP3 to Bunny.net")
+        return None
+
+
+def text_to_speech(text):
+    """Convert text to speech using OpenAI API and return MP3 audio data."""
+    try:
+        url = f"{OPENAI_API_URL}/audio/speech"
+        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
+        payload = {"model": "tts-1", "input": text, "voice": OPENAI_TTS_VOICE}
+
+        with timed(UPSTREAM_LATENCY, "upstream.openai_tts", service="openai_tts", outcome="error") as labels:
+            response = requests.post(url, json=payload, headers=headers)
+            labels["outcome"] = "ok" if response.status_code == 200 else "failed"
+
+        if response.status_code == 200:
+            logger.info("TTS conversion successful", extra={"chars": len(text), "bytes": len(response.content)})
+            return response.content  # MP3 binary data
+        else:
+            logger.error("OpenAI API error", extra={"status": response.status_code, "body": response.text})
+            return None
+    except Exception:
+        logger.exception("Error converting text to speech")
+        return None
+
+
+def convert_ogg_to_mp3(audio_ogg, media_id):
+    """Convert OGG to MP3 and upload to Bunny.net, returning the MP3 URL."""
+    try:
+        input_stream = io.BytesIO(audio_ogg)
+
+        # Convert OGG to MP3 using FFmpeg
+        start = time.perf_counter()
+        process = (
+            ffmpeg.input("pipe:0", format="ogg")
+            .output("pipe:1", format="mp3", audio_bitrate="192k")
+            .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+        )
+        mp3_data, err = process.communicate(input_stream.read())
+        duration = time.perf_counter() - start
+        FFMPEG_DURATION.observe(duration)
+        record_span("ffmpeg", duration)
+        FFMPEG_BYTES.labels(direction="in").inc(len(audio_ogg))
+
+        if process.returncode != 0:
+            logger.error(
+                "FFmpeg error", extra={"returncode": process.returncode, "stderr": err.decode(errors="replace")}
+            )
+            return None
+
+        FFMPEG_BYTES.labels(direction="out").inc(len(mp3_data))
+        logger.info(
+            "OGG converted to MP3",
+            extra={"seconds": round(duration, 3), "in_bytes": len(audio_ogg), "out_bytes": len(mp3_data)},
+        )
+
+        return upload_mp3_to_bunny(mp3_data, media_id)
+
+    except Exception:
+        logger.exception("Error during conversion or upload")
+        return None
+
+
+# --- TELEGRAM HANDLERS ---
+def handle_register_device(message):
+    """Admin-only: /register_device <name> creates a postbox and replies with its API token."""
+    if str(message.from_user.id) not in ADMIN_TELEGRAM_IDS:
+        return
+
+    name = message.text.partition(" ")[2].strip()
+    if not name:
+        bot.reply_to(message, "Usage: /register_device <name>")
+        return
+
+    device_id, token = register_device(name)
+    if not device_id:
+        bot.reply_to(message, f"❌ Could not register postbox '{name}'. Is the name already taken?")
+        return
+
+    # Plain text: a name like "kids_room" is broken Markdown, and Telegram would
+    # reject the only message that ever shows this token
+    bot.reply_to(
+        message,
+        f"📮 Registered postbox '{name}' (device {device_id}).\nAPI token: {token}\n"
+        "Send it as 'Authorization: Bearer <token>'. It will not be shown again.",
+    )
+
+
+def handle_choose_postbox(message):
+    """/postbox <name> routes the sender's future messages to that postbox."""
+    name = message.text.partition(" ")[2].strip()
+    if not name:
+        bot.reply_to(message, "Usage: /postbox <name>")
+        return
+    choose_postbox(message, name)
+
+
+def choose_postbox(message, name):
+    sender_id = str(message.from_user.id)
+    device = get_device_by_name(name)
+    if not device:
+        bot.reply_to(message, f"No postbox called '{name}'.")
+        return
+
+    if assign_sender_device(sender_id, device["id"]):
+        bot.reply_to(message, f"📮 Your messages will now go to the '{device['name']}' postbox.")
+    else:
+        bot.reply_to(message, "❌ Something went wrong, please try again.")
+
+
+def send_welcome(message):
+    sender_id = str(message.from_user.id)
+
+    # Deep links (t.me/<bot>?start=<postbox name>) pick the postbox straight away
+    postbox_name = message.text.partition(" ")[2].strip()
+    if postbox_name:
+        choose_postbox(message, postbox_name)
+
+    if sender_id in ADMIN_TELEGRAM_IDS:
+        bot.send_message(
+            message.chat.id,
+            "Hi Jones's! Use the button below to control the postbox.",
+            reply_markup=get_admin_keyboard(),
+        )
+    else:
+        bot.send_message(
+            message.chat.id,
+            "👋 Welcome to Vivi's Postbox! Send me a voice message or text, and I'll make sure Vivi hears it. If you're new, your message will need approval first.",
+        )
+
+
+def handle_incoming_message(message):
+    sender_id = str(message.from_user.id)
+    sender_name = message.from_user.first_name + " " + (message.from_user.last_name or "")
+    received_at = datetime.utcnow()
+
+    if message.text and message.text.startswith("/"):
+        logger.info("Ignoring command message", extra={"sender_id": sender_id, "command": message.text})
+        return
+
+    # Check if user is blocked
+    connection = connect_db()
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM vivi_users WHERE phone = %s", (sender_id,))
+    user = cursor.fetchone()
+    cursor.close()
+    connection.close()
+
+    if user and user.get("blocked"):
+        return
+
+    mp3_url = None
+    text_body = None
+    message_type = "text"
+
+    if message.content_type == "voice":
+        message_type = "audio"
+        file_info = bot.get_file(message.voice.file_id)
+        downloaded_file = bot.download_file(file_info.file_path)
+        mp3_url = convert_ogg_to_mp3(downloaded_file, received_at.timestamp())
+    elif message.content_type == "text":
+        text_body = message.text
+        mp3_data = text_to_speech(text_body)
+        if mp3_data:
+            mp3_url = upload_mp3_to_bunny(mp3_data, received_at.timestamp())
+
+    # Queue the message on the sender's postbox
+    device_id = (user and user.get("device_id")) or DEFAULT_DEVICE_ID
+
+    # Save to Database
+    try:
+        connection = connect_db()
+        cursor = connection.cursor()
+        # queued is read from vivi_users at insert time, not from the lookup above,
+        # so a verification that lands while we transcode is not missed
+        insert_query = """
+            INSERT INTO vivi_messages (message, received_at, type, sender_name, sender_number, mp3_url, listened, device_id, queued)
+            VALUES (%s, %s, %s, %s, %s, %s, 0, %s,
+                (SELECT COUNT(*) FROM vivi_users WHERE phone = %s AND verified = 1 AND blocked = 0))
+        """
+        cursor.execute(
+            insert_query,
+            (text_body, received_at, message_type, sender_name, sender_id, mp3_url, device_id, sender_id),
+        )
+        connection.commit()
+        message_id = cursor.lastrowid
+
+        # New User / Verification Logic
+        if not user:
+            cursor.execute(
+                """
+                INSERT INTO vivi_users (phone, verified, blocked, message_id) VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE message_id = VALUES(message_id)
+                """,
+                (sender_id, False, False, message_id),
+            )
+            connection.commit()
+            send_admin_verification(sender_id, sender_name)
+        elif not user.get("verified"):
+            cursor.execute("UPDATE vivi_users SET message_id = %s WHERE phone = %s", (message_id, sender_id))
+            connection.commit()
+            send_admin_verification(sender_id, sender_name)
+
+        cursor.close()
+        connection.close()
+        bot.reply_to(message, "✅ Got it! Your message is saved and waiting for Vivi to listen to it.")
+    except Exception:
+        logger.exception("Error saving message", extra={"sender_id": sender_id})
+
+
+def send_admin_verification(sender_id, sender_name):
+    """Notifies you on Telegram when a new user needs approval."""
+    verify_link = f"http://{DOMAIN}/vivi/verify_sender?phone={sender_id}"
+    msg = f"🔔 *New Message from Unverified Vivi Postbox User*\nName: {sender_name}\nID: {sender_id}\n\n[Verify or Block Here]({verify_link})"
+    for admin in ADMIN_TELEGRAM_IDS:
+        try:
+            bot.send_message(admin, msg, parse_mode="Markdown")
+        except Exception:
+            logger.exception("Failed to notify admin", extra={"admin": admin})
@@ -0,0 +1,22 @@
+"""
+Entry point for gunicorn: `python serve.py [gunicorn options] main:app`.
+
+gunicorn imports ssl while it loads, before gunicorn.conf.py runs. gevent has
+to patch before that, or ssl keeps blocking sockets and can fail with
+RecursionError on HTTPS calls, so gevent mode is patched here, ahead of any
+gunicorn import.
+"""
+
+import os
+import sys
+
+if os.getenv("GUNICORN_WORKER_CLASS") == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+from gunicorn.app.wsgiapp import run  # noqa: E402
+
+if __name__ == "__main__":
+    sys.argv = [sys.argv[0], "-c", "gunicorn.conf.py"] + sys.argv[1:]
+    run()